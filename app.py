@@ -1,20 +1,97 @@
 import streamlit as st
 import anthropic
+import asyncio
 import os
 import openai
 import sounddevice as sd
 import soundfile as sf
-import tempfile
 import numpy as np
 import base64
+import hashlib
+import io
+import re
 import time
 import random
-from typing import Optional
+import threading
+from collections import OrderedDict
+from html import escape
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, Optional
 from dotenv import load_dotenv
-from elevenlabs import ElevenLabs
+from elevenlabs import AsyncElevenLabs, ElevenLabs
+from elevenlabs.core import ApiError
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import httpx
 
-# Load environment variables
-load_dotenv()
+# Story guidelines shared by every request, sent as a cacheable system prompt
+STORY_SYSTEM_PROMPT = [{
+    "type": "text",
+    "text": """Create a gentle, imaginative bedtime story for a 6-year-old child. The story should be:
+- 3-4 minutes long when read aloud (approximately 400-600 words)
+- Age-appropriate with a comforting, peaceful ending
+- Creative and engaging but not overstimulating before bedtime
+- Include a gentle moral or lesson
+
+Please write a complete story with a clear beginning, middle, and end. Make it warm and soothing for bedtime.""",
+    "cache_control": {"type": "ephemeral"}
+}]
+
+# Sentence boundaries used to chunk stories for narration
+_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+# Minimum seconds between redraws of a story that is still streaming in
+STREAM_RENDER_INTERVAL = 0.1
+
+# Default number of ElevenLabs requests in flight at once; the lower plans
+# allow only 2, so raise it with ELEVENLABS_CONCURRENCY on a bigger plan
+TTS_CONCURRENCY = 2
+
+# Narrations kept in memory across all sessions (one per story and voice)
+AUDIO_STORE_MAX_ENTRIES = 64
+
+# Stories kept per session for repeated requests, and for how many seconds
+STORY_CACHE_MAX_ENTRIES = 16
+STORY_CACHE_TTL = 3600
+
+# Narrator voices offered in the sidebar as (name, ElevenLabs voice ID)
+VOICE_OPTIONS = [
+    ("Burt Reynolds", "4YYIPFl9wE5c4L2eu2Gb"),
+    ("DanShahDotCom", "L2Ztarb5Q7APkwWdQTDy"),
+    ("Adam - Warm Male", "pNInz6obpgDQGcFmaJgB"),
+    ("Bella - Gentle Female", "EXAVITQu4vr4xnSDxMaL"),
+    ("Rachel - Storyteller", "21m00Tcm4TlvDq8ikWAM"),
+    ("Antoni - Deep Male", "ErXwobaYiN019PkySvjV"),
+    ("Domi - Cheerful Female", "AZnzlk1XvdvUeBnXmlld"),
+    ("Demon Monster", "vfaqCOvlrKi4Zp7C2IAm")
+]
+
+# Rate limits, timeouts and 5xx/overloaded responses from the SDKs are worth retrying
+RETRYABLE_ERRORS = (
+    anthropic.RateLimitError,
+    anthropic.APITimeoutError,
+    anthropic.InternalServerError,
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+    httpx.TimeoutException,
+)
+
+# Error types Claude reports in a stream's error event, after the HTTP 200
+RETRYABLE_STREAM_ERRORS = ("overloaded_error", "rate_limit_error", "api_error")
+
+def is_retryable(error: Exception) -> bool:
+    """Tell transient API failures apart from ones that will fail again."""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    # The SDK raises in-stream errors with the stream's 200 status, so look at the error type
+    if isinstance(error, anthropic.APIStatusError) and isinstance(error.body, dict):
+        details = error.body.get("error")
+        return isinstance(details, dict) and details.get("type") in RETRYABLE_STREAM_ERRORS
+    # ElevenLabs raises one error type for every status, including its
+    # too-many-concurrent-requests 429
+    if isinstance(error, ApiError) and error.status_code is not None:
+        return error.status_code == 429 or error.status_code >= 500
+    return False
 
 def retry_with_backoff(func, max_retries=3, base_delay=1, max_delay=60, backoff_factor=2):
     """
@@ -31,17 +108,12 @@ def retry_with_backoff(func, max_retries=3, base_delay=1, max_delay=60, backoff_
         try:
             return func()
         except Exception as e:
-            error_str = str(e)
-            
             # Check if this is a retryable error
-            if any(error_type in error_str.lower() for error_type in [
-                'overloaded', 'rate limit', 'timeout', '429', '500', '502', '503', '504'
-            ]):
+            if is_retryable(e):
                 if attempt < max_retries:
-                    # Calculate delay with jitter
-                    delay = min(base_delay * (backoff_factor ** attempt), max_delay)
-                    jitter = random.uniform(0.1, 0.3) * delay
-                    total_delay = delay + jitter
+                    # Full jitter: pick anywhere up to the capped exponential delay so
+                    # concurrent retries spread out instead of firing together
+                    total_delay = random.uniform(0, min(base_delay * (backoff_factor ** attempt), max_delay))
                     
                     st.warning(f"API temporarily overloaded. Retrying in {total_delay:.1f} seconds... (Attempt {attempt + 1}/{max_retries + 1})")
                     time.sleep(total_delay)
@@ -53,6 +125,21 @@ def retry_with_backoff(func, max_retries=3, base_delay=1, max_delay=60, backoff_
                 # Non-retryable error, raise immediately
                 raise e
 
+async def retry_with_backoff_async(func, max_retries=3, base_delay=1, max_delay=60, backoff_factor=2):
+    """
+    Async version of retry_with_backoff for coroutine functions.
+
+    Retries wait with asyncio.sleep so other requests keep running, and they
+    are not announced on the page; the caller reports what finally failed.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await func()
+        except Exception as e:
+            if not is_retryable(e) or attempt == max_retries:
+                raise
+            await asyncio.sleep(random.uniform(0, min(base_delay * (backoff_factor ** attempt), max_delay)))
+
 # Configure the page
 st.set_page_config(
     page_title="Bedtime Story Generator",
@@ -60,187 +147,493 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource(show_spinner=False)
+def get_settings() -> dict:
+    """Load API keys and settings from the environment and .env file, once per process."""
+    load_dotenv(override=False)
+    settings = {
+        name: os.environ.get(name)
+        for name in ("ANTHROPIC_API_KEY", "OPENAI_API_KEY", "ELEVENLABS_API_KEY")
+    }
+    # A malformed limit falls back to the default rather than breaking narration
+    try:
+        settings["ELEVENLABS_CONCURRENCY"] = max(1, int(os.environ.get("ELEVENLABS_CONCURRENCY", TTS_CONCURRENCY)))
+    except ValueError:
+        settings["ELEVENLABS_CONCURRENCY"] = TTS_CONCURRENCY
+    return settings
+
+@st.cache_resource(show_spinner=False)
+def get_http_client() -> httpx.Client:
+    """Create the keep-alive HTTP/2 client shared by all API clients."""
+    return httpx.Client(
+        http2=True,
+        timeout=240,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=300)
+    )
+
+@st.cache_resource(show_spinner=False)
 def get_claude_client() -> Optional[anthropic.Anthropic]:
     """Initialize Claude client with API key."""
-    api_key = os.getenv("ANTHROPIC_API_KEY")
+    api_key = get_settings()["ANTHROPIC_API_KEY"]
     if not api_key:
         return None
-    return anthropic.Anthropic(api_key=api_key)
+    return anthropic.Anthropic(api_key=api_key, http_client=get_http_client())
 
+@st.cache_resource(show_spinner=False)
 def get_openai_client() -> Optional[openai.OpenAI]:
     """Initialize OpenAI client with API key."""
-    api_key = os.getenv("OPENAI_API_KEY")
+    api_key = get_settings()["OPENAI_API_KEY"]
     if not api_key:
         return None
-    return openai.OpenAI(api_key=api_key)
+    return openai.OpenAI(api_key=api_key, http_client=get_http_client())
 
+@st.cache_resource(show_spinner=False)
 def get_elevenlabs_client() -> Optional[ElevenLabs]:
     """Initialize ElevenLabs client with API key."""
-    api_key = os.getenv("ELEVENLABS_API_KEY")
+    api_key = get_settings()["ELEVENLABS_API_KEY"]
     if not api_key:
         return None
-    return ElevenLabs(api_key=api_key)
+    return ElevenLabs(api_key=api_key, httpx_client=get_http_client())
 
-def record_audio(duration=5, sample_rate=16000):
-    """Record audio from microphone."""
-    recording = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1, dtype='float32')
-    return recording, sample_rate
+@st.cache_resource(show_spinner=False)
+def init_clients() -> tuple[Optional[anthropic.Anthropic], Optional[openai.OpenAI], Optional[ElevenLabs]]:
+    """Initialize all API clients in parallel, once per process."""
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        claude_client, openai_client, elevenlabs_client = executor.map(
+            lambda get_client: get_client(),
+            (get_claude_client, get_openai_client, get_elevenlabs_client)
+        )
+    return claude_client, openai_client, elevenlabs_client
 
-def transcribe_audio(client: openai.OpenAI, audio_data, sample_rate):
+# Voice input is memory/IO-bound, not compute-bound: the microphone callback copies
+# PCM blocks, WAV encoding is a header plus those bytes, and the rest is the upload.
+# Speedups come from moving fewer bytes (int16, no temp file), not from faster math.
+def record_audio(duration=5, sample_rate=16000) -> io.BytesIO:
+    """Record audio from microphone into an in-memory 16-bit WAV file."""
+    total_frames = int(duration * sample_rate)
+    frames_written = 0
+    finished = threading.Event()
+    buffer = io.BytesIO()
+    with sf.SoundFile(buffer, mode='w', samplerate=sample_rate, channels=1, format='WAV', subtype='PCM_16') as wav:
+        def _write_block(indata, frames, time_info, status):
+            nonlocal frames_written
+            block = indata[:total_frames - frames_written]
+            wav.write(block)
+            frames_written += len(block)
+            if frames_written >= total_frames:
+                raise sd.CallbackStop
+        
+        # Encode each 400 ms block as the microphone delivers it, so the
+        # WAV is ready to upload the moment recording stops. Sleeping for the
+        # duration would cut off the last partial block, so stop on frame count
+        with sd.InputStream(samplerate=sample_rate, channels=1, dtype='int16',
+                            blocksize=int(0.4 * sample_rate), callback=_write_block,
+                            finished_callback=finished.set):
+            finished.wait(timeout=duration + 5)
+    buffer.seek(0)
+    return buffer
+
+def transcribe_audio(client: openai.OpenAI, wav_file: io.BytesIO):
     """Transcribe audio using OpenAI Whisper."""
     try:
-        # Save audio to temporary file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            sf.write(temp_file.name, audio_data, sample_rate)
-            
-            # Transcribe using Whisper
-            with open(temp_file.name, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language="en"
-                )
-            
-            # Clean up temp file
-            os.unlink(temp_file.name)
-            
-            return transcript.text
+        transcript = client.audio.transcriptions.create(
+            model="whisper-1",
+            file=("audio.wav", wav_file, "audio/wav"),
+            language="en"
+        )
+        
+        return transcript.text
     except Exception as e:
         return f"Error transcribing audio: {str(e)}"
 
-def generate_story_images(client: openai.OpenAI, story: str, story_prompt: str, child_name: str = "", model: str = "dall-e-2") -> tuple[Optional[str], Optional[str]]:
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _generate_image(prompt: str, model: str) -> str:
+    """Generate one illustration with DALL-E, memoized on prompt and model."""
+    # Set quality parameter only for DALL-E 3
+    kwargs = {
+        "model": model,
+        "prompt": prompt,
+        "size": "1024x1024",
+        "n": 1,
+    }
+    if model == "dall-e-3":
+        kwargs["quality"] = "standard"
+    
+    response = get_openai_client().images.generate(**kwargs)
+    return response.data[0].url
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def fetch_image_bytes(url: str) -> bytes:
+    """Download a generated image so it is not refetched from its URL on every rerun."""
+    response = get_http_client().get(url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+def generate_story_images(story: str, story_prompt: str, child_name: str = "", model: str = "dall-e-2") -> tuple[Optional[bytes], Optional[bytes]]:
     """Generate two images for the story using DALL-E - one for each half."""
     try:
-        # Split story into two halves
-        sentences = story.split('. ')
-        mid_point = len(sentences) // 2
-        first_half = '. '.join(sentences[:mid_point])
-        second_half = '. '.join(sentences[mid_point:])
+        # Find where the second half of the story starts; only 150 characters
+        # of each half reach the prompts, so slice instead of splitting and joining
+        text = story.strip()
+        boundaries = [match.span() for match in _SENT_SPLIT.finditer(text)]
+        mid_point = (len(boundaries) + 1) // 2
+        first_end, second_start = boundaries[mid_point - 1] if mid_point else (0, 0)
+        first_half = text[:min(first_end, 150)]
+        second_half = text[second_start:second_start + 150]
         
         # Create child-friendly, illustration-style prompts with explicit no-text instructions
         base_style = "Children's book illustration style, soft colors, whimsical, gentle, appropriate for bedtime stories. NO TEXT, NO WORDS, NO LETTERS, NO WRITING in the image. Pure illustration only"
         
-        # Generate prompts for each half
-        first_prompt = f"{base_style}. Visual scene showing: {story_prompt}"
+        # Both prompts share the style and subject; only the scene differs
+        scene_prompt = f"{base_style}. Visual scene showing: {story_prompt}"
         if child_name:
-            first_prompt += f" with a child character"
-        first_prompt += f". Beginning scene: {first_half[:150]}... NO TEXT OR WORDS in image"
+            scene_prompt += " with a child character"
+        first_prompt = f"{scene_prompt}. Beginning scene: {first_half}... NO TEXT OR WORDS in image"
+        second_prompt = f"{scene_prompt}. Ending scene: {second_half}... NO TEXT OR WORDS in image"
         
-        second_prompt = f"{base_style}. Visual scene showing: {story_prompt}"
-        if child_name:
-            second_prompt += f" with a child character"
-        second_prompt += f". Ending scene: {second_half[:150]}... NO TEXT OR WORDS in image"
+        def _illustrate(prompt: str) -> bytes:
+            url = retry_with_backoff(lambda: _generate_image(prompt, model))
+            return fetch_image_bytes(url)
         
-        # Generate first image with retry logic
-        def _generate_first_image():
-            # Set quality parameter only for DALL-E 3
-            kwargs = {
-                "model": model,
-                "prompt": first_prompt,
-                "size": "1024x1024",
-                "n": 1,
-            }
-            if model == "dall-e-3":
-                kwargs["quality"] = "standard"
-            
-            response = client.images.generate(**kwargs)
-            return response.data[0].url
-        
-        first_image_url = retry_with_backoff(_generate_first_image)
-        
-        # Generate second image with retry logic
-        def _generate_second_image():
-            # Set quality parameter only for DALL-E 3
-            kwargs = {
-                "model": model,
-                "prompt": second_prompt,
-                "size": "1024x1024",
-                "n": 1,
-            }
-            if model == "dall-e-3":
-                kwargs["quality"] = "standard"
-            
-            response = client.images.generate(**kwargs)
-            return response.data[0].url
-        
-        second_image_url = retry_with_backoff(_generate_second_image)
-        
-        return first_image_url, second_image_url
+        # Request and download both images at once; workers share the script
+        # context so retry warnings still reach the page
+        with ThreadPoolExecutor(max_workers=2, initializer=add_script_run_ctx,
+                                initargs=(None, get_script_run_ctx())) as executor:
+            first_future = executor.submit(_illustrate, first_prompt)
+            second_future = executor.submit(_illustrate, second_prompt)
+            return first_future.result(), second_future.result()
         
     except Exception as e:
         st.error(f"Error generating images: {str(e)}")
         return None, None
 
-def text_to_speech(client: ElevenLabs, text: str, voice_id: str = "pNInz6obpgDQGcFmaJgB") -> Optional[bytes]:
+def text_to_speech(text: str, voice_id: str = "pNInz6obpgDQGcFmaJgB") -> Optional[bytes]:
     """Convert text to speech using ElevenLabs."""
     try:
-        # Generate speech using the correct method
-        audio = client.text_to_speech.convert(
+        # convert yields the MP3 in chunks; the player needs all of it
+        audio = bytearray()
+        for chunk in get_elevenlabs_client().text_to_speech.convert(
             voice_id=voice_id,
             text=text,
             model_id="eleven_monolingual_v1"
-        )
-        
-        # Convert generator to bytes
-        audio_bytes = b"".join(audio)
-        return audio_bytes
+        ):
+            audio.extend(chunk)
+        return bytes(audio)
     except Exception as e:
         st.error(f"Error generating speech: {str(e)}")
         return None
 
-def create_audio_player(audio_bytes: bytes, voice_name: str = "") -> str:
-    """Create a simple HTML audio player."""
-    b64 = base64.b64encode(audio_bytes).decode()
-    
-    html = f'''
-    <div style="margin: 20px 0;">
-        <h4>🎧 {voice_name}</h4>
-        <audio controls style="width: 100%;">
-            <source src="data:audio/mpeg;base64,{b64}" type="audio/mpeg">
-            Your browser does not support the audio element.
-        </audio>
-    </div>
+@st.cache_resource(show_spinner=False)
+def get_audio_store() -> tuple[OrderedDict, threading.Lock]:
+    """Narration audio shared by all sessions, keyed by (story hash, voice ID)."""
+    return OrderedDict(), threading.Lock()
+
+def _audio_key(story: str, voice_id: str) -> tuple[bytes, str]:
+    return hashlib.sha256(story.encode()).digest(), voice_id
+
+def store_audio(story: str, voice_id: str, audio: bytes):
+    """Keep narration for a story, dropping the least recently used beyond the limit."""
+    store, lock = get_audio_store()
+    key = _audio_key(story, voice_id)
+    with lock:
+        store[key] = audio
+        store.move_to_end(key)
+        while len(store) > AUDIO_STORE_MAX_ENTRIES:
+            store.popitem(last=False)
+
+def load_audio(story: str, voice_id: str) -> Optional[bytes]:
+    """Look up stored narration; never calls ElevenLabs."""
+    store, lock = get_audio_store()
+    key = _audio_key(story, voice_id)
+    with lock:
+        if key not in store:
+            return None
+        store.move_to_end(key)
+        return store[key]
+
+def split_story_sentences(story: str) -> list[str]:
+    """Split a story into sentences."""
+    return [s.strip() for s in _SENT_SPLIT.split(story.strip()) if s.strip()]
+
+# Read-along player; filled in with str.format, so literal braces are doubled
+_READ_ALONG_TEMPLATE = '''
+    <style>
+        .story {{
+            margin-top: 20px;
+            padding: 20px;
+            background-color: #f8f9fa;
+            border-radius: 10px;
+            font-family: sans-serif;
+            font-size: 1.1em;
+            line-height: 1.8;
+            border-left: 4px solid #007acc;
+        }}
+        .sentence {{ padding: 2px 4px; border-radius: 3px; }}
+        .done {{ background-color: #c8e6c9; opacity: 0.8; }}
+        .current {{ background-color: #ffeb3b; font-weight: bold; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
+    </style>
+    <audio id="narration" controls style="width: 100%;">
+        <source src="data:audio/mpeg;base64,{b64}" type="audio/mpeg">
+        Your browser does not support the audio element.
+    </audio>
+    <div class="story">{spans}</div>
+    <script>
+        const audio = document.getElementById("narration");
+        const spans = Array.from(document.querySelectorAll(".sentence"));
+        // Estimate each sentence's share of the narration from its length
+        const ends = [];
+        spans.reduce((end, span) => {{
+            ends.push(end + span.textContent.length);
+            return ends[ends.length - 1];
+        }}, 0);
+        const total = ends.length ? ends[ends.length - 1] : 0;
+        let current = -1;
+        
+        audio.ontimeupdate = () => {{
+            if (!audio.duration) return;
+            const position = audio.ended ? total : (audio.currentTime / audio.duration) * total;
+            let next = ends.findIndex(end => position < end);
+            if (next === -1) next = spans.length;
+            if (next === current) return;
+            
+            // Only restyle the sentences between the old and new positions
+            const first = Math.max(0, Math.min(current, next));
+            const last = Math.min(spans.length - 1, Math.max(current, next));
+            for (let i = first; i <= last; i++) {{
+                const state = i < next ? "done" : i === next ? "current" : "pending";
+                spans[i].className = "sentence " + state;
+            }}
+            current = next;
+        }};
+        audio.onended = audio.ontimeupdate;
+    </script>
     '''
-    return html
 
-def generate_story(client: anthropic.Anthropic, prompt: str, child_name: str = "", theme: str = "") -> str:
-    """Generate a bedtime story using Claude."""
-    
-    story_prompt = f"""Create a gentle, imaginative bedtime story for a 6-year-old child. The story should be:
-- 3-4 minutes long when read aloud (approximately 400-600 words)
-- Age-appropriate with a comforting, peaceful ending
-- Creative and engaging but not overstimulating before bedtime
-- Include a gentle moral or lesson
+def create_read_along_player(audio_bytes: bytes, sentences: list[str]) -> str:
+    """Create an audio player that highlights each sentence as it is narrated."""
+    spans = " ".join(f'<span class="sentence pending">{escape(sentence)}</span>' for sentence in sentences)
+    return _READ_ALONG_TEMPLATE.format(b64=base64.b64encode(audio_bytes).decode('ascii'), spans=spans)
 
-Story idea: {prompt}
+def build_story_prompt(prompt: str, child_name: str = "", theme: str = "") -> str:
+    """Build the per-story part of the Claude prompt."""
+    return f"""Story idea: {prompt}
 
 {f"Main character name: {child_name}" if child_name else ""}
-{f"Theme/Setting: {theme}" if theme else ""}
+{f"Theme/Setting: {theme}" if theme else ""}"""
+
+def _text_deltas(events) -> Iterator[str]:
+    """Pick the story text out of Claude's stream events."""
+    for event in events:
+        if event.type == "content_block_delta" and event.delta.type == "text_delta":
+            yield event.delta.text
 
-Please write a complete story with a clear beginning, middle, and end. Make it warm and soothing for bedtime."""
+async def _text_deltas_async(events) -> AsyncIterator[str]:
+    """Pick the story text out of Claude's async stream events."""
+    async for event in events:
+        if event.type == "content_block_delta" and event.delta.type == "text_delta":
+            yield event.delta.text
 
-    def _generate_story():
-        message = client.messages.create(
+def stream_story(prompt: str, child_name: str = "", theme: str = "") -> Iterator[str]:
+    """Stream a bedtime story from Claude as it is written."""
+    client = get_claude_client()
+
+    def _open_stream():
+        texts = _text_deltas(client.messages.create(
             model="claude-3-5-sonnet-20241022",
             max_tokens=1000,
             temperature=0.7,
-            messages=[{"role": "user", "content": story_prompt}]
-        )
-        return message.content[0].text
-    
+            system=STORY_SYSTEM_PROMPT,
+            messages=[{"role": "user", "content": build_story_prompt(prompt, child_name, theme)}],
+            stream=True
+        ))
+        # Overloads can also arrive as an error event after the HTTP 200, so the
+        # request is only retried as a whole until its first text has arrived
+        return next(texts, ""), texts
+
+    first_text, texts = retry_with_backoff(_open_stream)
+    if first_text:
+        yield first_text
+    yield from texts
+
+def get_cached_story(prompt: str, child_name: str = "", theme: str = "") -> Optional[str]:
+    """Return the story already written in this session for the same request, if still fresh."""
+    cache = st.session_state.setdefault("story_cache", OrderedDict())
+    key = (prompt, child_name, theme)
+    if key not in cache:
+        return None
+    written_at, story = cache[key]
+    if time.monotonic() - written_at > STORY_CACHE_TTL:
+        del cache[key]
+        return None
+    return story
+
+def cache_story(prompt: str, child_name: str, theme: str, story: str):
+    """Remember a story for this session, dropping the oldest beyond the limit."""
+    cache = st.session_state.setdefault("story_cache", OrderedDict())
+    key = (prompt, child_name, theme)
+    cache[key] = (time.monotonic(), story)
+    cache.move_to_end(key)
+    while len(cache) > STORY_CACHE_MAX_ENTRIES:
+        cache.popitem(last=False)
+
+def generate_story(prompt: str, child_name: str = "", theme: str = "", placeholder=None) -> str:
+    """Generate a bedtime story using Claude, showing it in the placeholder as it arrives."""
+    # Identical requests reuse the story already written in this session
+    cached_story = get_cached_story(prompt, child_name, theme)
+    if cached_story is not None:
+        return cached_story
+
+    story = ""
+    last_render = 0.0
     try:
-        return retry_with_backoff(_generate_story)
+        for text in stream_story(prompt, child_name, theme):
+            story += text
+            # Each redraw resends the whole story, so batch tokens between redraws
+            if placeholder and time.monotonic() - last_render >= STREAM_RENDER_INTERVAL:
+                placeholder.markdown(story)
+                last_render = time.monotonic()
     except Exception as e:
         return f"Error generating story: {str(e)}"
+    if placeholder:
+        placeholder.markdown(story)
+
+    cache_story(prompt, child_name, theme, story)
+    return story
+
+async def _synthesize_speech(client: AsyncElevenLabs, limiter: asyncio.Semaphore, text: str, voice_id: str) -> bytes:
+    """Convert text to speech using the async ElevenLabs client, retrying transient errors."""
+    async def _convert():
+        async with limiter:
+            audio = bytearray()
+            async for chunk in client.text_to_speech.convert(
+                voice_id=voice_id,
+                text=text,
+                model_id="eleven_monolingual_v1"
+            ):
+                audio.extend(chunk)
+            return bytes(audio)
+
+    return await retry_with_backoff_async(_convert)
+
+async def generate_narrated_story(prompt: str, child_name: str, theme: str, voice_id: str, placeholder=None,
+                                  on_story_complete=None) -> tuple[str, Optional[bytes]]:
+    """Stream a story from Claude and narrate each sentence as soon as it is written.
+
+    on_story_complete, if given, is called with the finished story text while
+    the remaining narration is still being synthesized. A request already made
+    in this session reuses its story, and its narration if that is still stored.
+    """
+    cached_story = get_cached_story(prompt, child_name, theme)
+    if cached_story is not None:
+        if placeholder:
+            placeholder.markdown(cached_story)
+        if on_story_complete:
+            on_story_complete(cached_story)
+        cached_audio = load_audio(cached_story, voice_id)
+        if cached_audio is not None:
+            return cached_story, cached_audio
+
+    story_prompt = build_story_prompt(prompt, child_name, theme)
+    limiter = asyncio.Semaphore(get_settings()["ELEVENLABS_CONCURRENCY"])
+    tasks = []
+    story = ""
+    pending = ""
+    last_render = 0.0
+
+    async with anthropic.AsyncAnthropic(api_key=get_settings()["ANTHROPIC_API_KEY"]) as claude_client, \
+            httpx.AsyncClient(timeout=240) as http_client:
+        elevenlabs_client = AsyncElevenLabs(api_key=get_settings()["ELEVENLABS_API_KEY"], httpx_client=http_client)
+
+        async def _open_stream():
+            texts = _text_deltas_async(await claude_client.messages.create(
+                model="claude-3-5-sonnet-20241022",
+                max_tokens=1000,
+                temperature=0.7,
+                system=STORY_SYSTEM_PROMPT,
+                messages=[{"role": "user", "content": story_prompt}],
+                stream=True
+            ))
+            # Retry the whole request until its first text, as stream_story does
+            try:
+                return await texts.__anext__(), texts
+            except StopAsyncIteration:
+                return "", texts
+
+        def _add_text(text: str):
+            nonlocal story, pending, last_render
+            story += text
+            if placeholder and time.monotonic() - last_render >= STREAM_RENDER_INTERVAL:
+                placeholder.markdown(story)
+                last_render = time.monotonic()
+            # Everything but the last piece is a finished sentence
+            *sentences, pending = _SENT_SPLIT.split(pending + text)
+            for sentence in sentences:
+                tasks.append(asyncio.create_task(
+                    _synthesize_speech(elevenlabs_client, limiter, sentence, voice_id)
+                ))
+
+        if cached_story is not None:
+            # Only the narration is missing
+            story = cached_story
+            for sentence in split_story_sentences(story):
+                tasks.append(asyncio.create_task(
+                    _synthesize_speech(elevenlabs_client, limiter, sentence, voice_id)
+                ))
+        else:
+            try:
+                first_text, texts = await retry_with_backoff_async(_open_stream)
+                _add_text(first_text)
+                async for text in texts:
+                    _add_text(text)
+            except Exception as e:
+                for task in tasks:
+                    task.cancel()
+                return f"Error generating story: {str(e)}", None
+
+            if placeholder:
+                placeholder.markdown(story)
+            cache_story(prompt, child_name, theme, story)
+            if on_story_complete:
+                on_story_complete(story)
+
+            if pending.strip():
+                tasks.append(asyncio.create_task(
+                    _synthesize_speech(elevenlabs_client, limiter, pending.strip(), voice_id)
+                ))
+
+        # Gather keeps the sentence order, so the MP3 frames concatenate in reading order;
+        # a sentence that still fails after its retries is left out instead of losing the rest
+        audio_chunks = await asyncio.gather(*tasks, return_exceptions=True)
+
+    audio = bytearray()
+    failures = [chunk for chunk in audio_chunks if isinstance(chunk, Exception)]
+    for chunk in audio_chunks:
+        if not isinstance(chunk, Exception):
+            audio.extend(chunk)
+    if failures:
+        if len(failures) == len(audio_chunks):
+            st.error(f"Error generating speech: {str(failures[0])}")
+            return story, None
+        st.warning(f"{len(failures)} of {len(audio_chunks)} sentences could not be narrated and were skipped: {str(failures[0])}")
+    return story, bytes(audio)
+
+async def generate_all_voices(text: str, voice_ids: list[str]) -> list:
+    """Narrate the same text with several voices concurrently."""
+    limiter = asyncio.Semaphore(get_settings()["ELEVENLABS_CONCURRENCY"])
+    async with httpx.AsyncClient(timeout=240) as http_client:
+        client = AsyncElevenLabs(api_key=get_settings()["ELEVENLABS_API_KEY"], httpx_client=http_client)
+        # Keep the voices that succeed even if one of them fails
+        return await asyncio.gather(
+            *[_synthesize_speech(client, limiter, text, voice_id) for voice_id in voice_ids],
+            return_exceptions=True
+        )
 
 def main():
     st.title("📚 Bedtime Story Generator")
     st.markdown("*Create magical bedtime stories for your little one*")
     
     # Initialize clients
-    claude_client = get_claude_client()
-    openai_client = get_openai_client()
-    elevenlabs_client = get_elevenlabs_client()
+    claude_client, openai_client, elevenlabs_client = init_clients()
     
     if not claude_client:
         st.error("⚠️ Please set your ANTHROPIC_API_KEY environment variable to use this app.")
@@ -262,16 +655,7 @@ def main():
             st.header("🔊 Voice Settings")
             voice_option = st.selectbox(
                 "Narrator Voice",
-                [
-                    ("Burt Reynolds", "4YYIPFl9wE5c4L2eu2Gb"),
-                    ("DanShahDotCom", "L2Ztarb5Q7APkwWdQTDy"),
-                    ("Adam - Warm Male", "pNInz6obpgDQGcFmaJgB"),
-                    ("Bella - Gentle Female", "EXAVITQu4vr4xnSDxMaL"),
-                    ("Rachel - Storyteller", "21m00Tcm4TlvDq8ikWAM"),
-                    ("Antoni - Deep Male", "ErXwobaYiN019PkySvjV"),
-                    ("Domi - Cheerful Female", "AZnzlk1XvdvUeBnXmlld"),
-                    ("Demon Monster", "vfaqCOvlrKi4Zp7C2IAm")
-                ],
+                VOICE_OPTIONS,
                 format_func=lambda x: x[0]
             )
             selected_voice_id = voice_option[1]
@@ -321,11 +705,10 @@ def main():
             
             if st.button("🎤 Record Story Idea (5 seconds)"):
                 with st.spinner("Recording... Speak now!"):
-                    recording, sample_rate = record_audio(duration=5)
-                    sd.wait()  # Wait for recording to finish
+                    recording = record_audio(duration=5)
                 
                 with st.spinner("Transcribing your voice..."):
-                    transcription = transcribe_audio(openai_client, recording, sample_rate)
+                    transcription = transcribe_audio(openai_client, recording)
                     if not transcription.startswith("Error"):
                         st.session_state.prompt = transcription
                         st.success(f"Heard: {transcription}")
@@ -334,11 +717,10 @@ def main():
             
             if st.button("🎤 Record Longer Idea (10 seconds)"):
                 with st.spinner("Recording... Speak now!"):
-                    recording, sample_rate = record_audio(duration=10)
-                    sd.wait()  # Wait for recording to finish
+                    recording = record_audio(duration=10)
                 
                 with st.spinner("Transcribing your voice..."):
-                    transcription = transcribe_audio(openai_client, recording, sample_rate)
+                    transcription = transcribe_audio(openai_client, recording)
                     if not transcription.startswith("Error"):
                         st.session_state.prompt = transcription
                         st.success(f"Heard: {transcription}")
@@ -359,10 +741,15 @@ def main():
         
         if "generated_story" in st.session_state:
             if st.button("🗑️ Clear Story"):
+                # Forget the cached story too, so the same idea gets a fresh one
+                metadata = st.session_state.get("story_metadata", {})
+                st.session_state.get("story_cache", {}).pop(
+                    (metadata.get("prompt", ""), metadata.get("child_name", ""), metadata.get("theme", "")), None
+                )
                 if "generated_story" in st.session_state:
                     del st.session_state.generated_story
-                if "story_audio" in st.session_state:
-                    del st.session_state.story_audio
+                if "story_voices" in st.session_state:
+                    del st.session_state.story_voices
                 if "story_metadata" in st.session_state:
                     del st.session_state.story_metadata
                 if "story_images" in st.session_state:
@@ -377,14 +764,46 @@ def main():
             "A magical tree that grew different fruits for different wishes"
         ]
         
-        for example in examples:
-            if st.button(f"📖 {example}", key=example):
-                st.session_state.prompt = example
+        # Set the prompt in a callback so it is in place before the rerun renders
+        example_cols = st.columns(2)
+        for i, example in enumerate(examples):
+            example_cols[i % 2].button(
+                f"📖 {example}",
+                key=example,
+                on_click=lambda example=example: st.session_state.update(prompt=example)
+            )
     
     # Generate and display story
     if generate_button and prompt:
+        # Show the story while it is being written
+        story_placeholder = st.empty()
         with st.spinner("Creating your magical story..."):
-            story = generate_story(claude_client, prompt, child_name, theme)
+            story_images = None
+            st.session_state.story_voices = set()
+            if enable_narration:
+                with ThreadPoolExecutor(max_workers=1, initializer=add_script_run_ctx,
+                                        initargs=(None, get_script_run_ctx())) as executor:
+                    image_jobs = []
+                    
+                    def _start_images(story: str):
+                        # Illustrate the finished text while narration is still being synthesized
+                        if enable_images and openai_client:
+                            image_jobs.append(executor.submit(
+                                generate_story_images, story, prompt, child_name, dalle_model
+                            ))
+                    
+                    # Narrate the story while Claude is still writing it
+                    story, audio_bytes = asyncio.run(
+                        generate_narrated_story(prompt, child_name, theme, selected_voice_id, story_placeholder,
+                                                on_story_complete=_start_images)
+                    )
+                    if image_jobs:
+                        story_images = image_jobs[0].result()
+                if audio_bytes:
+                    store_audio(story, selected_voice_id, audio_bytes)
+                    st.session_state.story_voices.add(selected_voice_id)
+            else:
+                story = generate_story(prompt, child_name, theme, story_placeholder)
             st.session_state.generated_story = story
             st.session_state.story_metadata = {
                 "prompt": prompt,
@@ -392,17 +811,20 @@ def main():
                 "theme": theme
             }
             
-            # Generate story images if enabled
-            if enable_images and openai_client:
+            # Generate story images if enabled and not already made alongside the narration
+            if enable_images and openai_client and story_images is None:
                 with st.spinner("🎨 Creating beautiful illustrations for your story..."):
-                    first_image_url, second_image_url = generate_story_images(
-                        openai_client, story, prompt, child_name, dalle_model
+                    story_images = generate_story_images(
+                        story, prompt, child_name, dalle_model
                     )
-                    if first_image_url and second_image_url:
-                        st.session_state.story_images = {
-                            "first_image": first_image_url,
-                            "second_image": second_image_url
-                        }
+            if story_images:
+                first_image, second_image = story_images
+                if first_image and second_image:
+                    st.session_state.story_images = {
+                        "first_image": first_image,
+                        "second_image": second_image
+                    }
+        story_placeholder.empty()
     
     # Display story if it exists
     if "generated_story" in st.session_state:
@@ -411,40 +833,40 @@ def main():
         st.markdown("---")
         st.subheader("🌙 Your Bedtime Story")
         
-        # Show story text with images integrated if no audio generated yet
-        if "story_audio" not in st.session_state or not st.session_state.story_audio:
-            if "story_images" in st.session_state:
-                # Split story into sentences for better image placement
-                sentences = story.split('. ')
-                sentences = [s.strip() + '.' if not s.endswith('.') else s.strip() for s in sentences if s.strip()]
-                
-                # Calculate midpoint for image placement
-                mid_point = len(sentences) // 2
-                
-                # First half of story
-                first_half = ' '.join(sentences[:mid_point])
-                second_half = ' '.join(sentences[mid_point:])
-                
-                # Display first half
-                st.markdown(first_half)
-                
-                # Display middle image
-                st.markdown("---")
-                st.markdown("### 🎨 Illustration")
-                st.image(st.session_state.story_images["first_image"], use_column_width=True)
-                st.markdown("---")
-                
-                # Display second half
-                st.markdown(second_half)
-                
-                # Display ending image
-                st.markdown("---")
-                st.markdown("### 🌙 The End")
-                st.image(st.session_state.story_images["second_image"], use_column_width=True)
-                st.markdown("---")
-            else:
-                # No images, show story normally
-                st.markdown(story)
+        # Show story text with images integrated; audio versions follow below
+        if "story_images" in st.session_state:
+            # Find the sentence boundaries for better image placement
+            text = story.strip()
+            boundaries = [match.span() for match in _SENT_SPLIT.finditer(text)]
+            
+            # Calculate midpoint for image placement
+            mid_point = (len(boundaries) + 1) // 2
+            
+            # Slice the original text so paragraph breaks survive in each half
+            first_end, second_start = boundaries[mid_point - 1] if mid_point else (0, 0)
+            first_half = text[:first_end]
+            second_half = text[second_start:]
+            
+            # Display first half
+            st.markdown(first_half)
+            
+            # Display middle image
+            st.markdown("---")
+            st.markdown("### 🎨 Illustration")
+            st.image(st.session_state.story_images["first_image"], use_column_width=True)
+            st.markdown("---")
+            
+            # Display second half
+            st.markdown(second_half)
+            
+            # Display ending image
+            st.markdown("---")
+            st.markdown("### 🌙 The End")
+            st.image(st.session_state.story_images["second_image"], use_column_width=True)
+            st.markdown("---")
+        else:
+            # No images, show story normally
+            st.markdown(story)
         
         # Image generation controls for existing stories
         if openai_client and "story_images" not in st.session_state:
@@ -452,16 +874,16 @@ def main():
             if st.button("🖼️ Generate Illustrations for This Story"):
                 metadata = st.session_state.get("story_metadata", {})
                 with st.spinner("🎨 Creating beautiful illustrations for your story..."):
-                    first_image_url, second_image_url = generate_story_images(
-                        openai_client, story, 
+                    first_image, second_image = generate_story_images(
+                        story, 
                         metadata.get("prompt", ""), 
                         metadata.get("child_name", ""),
                         "dall-e-2"  # Default to DALL-E 2 for manual generation
                     )
-                    if first_image_url and second_image_url:
+                    if first_image and second_image:
                         st.session_state.story_images = {
-                            "first_image": first_image_url,
-                            "second_image": second_image_url
+                            "first_image": first_image,
+                            "second_image": second_image
                         }
                         st.rerun()
         
@@ -471,34 +893,65 @@ def main():
             
             if st.button("🎧 Generate Audio with Selected Voice"):
                 with st.spinner(f"🎤 Generating voice narration with {voice_option[0]}..."):
-                    audio_bytes = text_to_speech(elevenlabs_client, story, selected_voice_id)
+                    # Narration already made for this story and voice is reused
+                    audio_bytes = load_audio(story, selected_voice_id) or text_to_speech(story, selected_voice_id)
                     
                     if audio_bytes:
-                        # Store audio in session state with voice name
-                        if "story_audio" not in st.session_state:
-                            st.session_state.story_audio = {}
-                        st.session_state.story_audio[selected_voice_id] = {
-                            "audio": audio_bytes,
-                            "voice_name": voice_option[0]
-                        }
+                        # The audio itself stays in the shared audio store
+                        store_audio(story, selected_voice_id, audio_bytes)
+                        st.session_state.setdefault("story_voices", set()).add(selected_voice_id)
+            
+            if st.button("🎧 Generate Audio with All Voices"):
+                # Only pay for the voices this story does not have yet
+                story_voices = st.session_state.setdefault("story_voices", set())
+                missing_voices = []
+                for voice_name, voice_id in VOICE_OPTIONS:
+                    if load_audio(story, voice_id) is None:
+                        missing_voices.append((voice_name, voice_id))
+                    else:
+                        story_voices.add(voice_id)
+                
+                if missing_voices:
+                    with st.spinner(f"🎤 Generating voice narration with {len(missing_voices)} more voices..."):
+                        results = asyncio.run(
+                            generate_all_voices(story, [voice_id for _, voice_id in missing_voices])
+                        )
+                        
+                        for (voice_name, voice_id), result in zip(missing_voices, results):
+                            if isinstance(result, Exception):
+                                st.error(f"Error generating speech with {voice_name}: {str(result)}")
+                            else:
+                                store_audio(story, voice_id, result)
+                                story_voices.add(voice_id)
+            
+            # Look up the generated audio versions in sidebar order; rendering never
+            # synthesizes, so voices that have left the shared audio store are dropped
+            story_audio = {}
+            expired_voices = []
+            for voice_name, voice_id in VOICE_OPTIONS:
+                if voice_id in st.session_state.get("story_voices", set()):
+                    audio_bytes = load_audio(story, voice_id)
+                    if audio_bytes:
+                        story_audio[(voice_name, voice_id)] = audio_bytes
+                    else:
+                        st.session_state.story_voices.discard(voice_id)
+                        expired_voices.append(voice_name)
+            if expired_voices:
+                st.info(f"⌛ The narration with {', '.join(expired_voices)} has expired. Generate the audio again to listen.")
             
             # Display all generated audio versions
-            if "story_audio" in st.session_state and st.session_state.story_audio:
+            if story_audio:
                 st.markdown("### 🔊 Available Audio Versions")
                 
-                # Show audio players
-                for voice_id, audio_data in st.session_state.story_audio.items():
-                    audio_html = create_audio_player(
-                        audio_data["audio"], 
-                        audio_data['voice_name']
-                    )
-                    st.markdown(audio_html, unsafe_allow_html=True)
+                for (voice_name, voice_id), audio_bytes in story_audio.items():
+                    st.markdown(f"#### 🎧 {voice_name}")
+                    st.audio(audio_bytes, format="audio/mpeg")
                     
                     # Download button for each voice
                     st.download_button(
-                        label=f"💾 Download {audio_data['voice_name']} Version",
-                        data=audio_data["audio"],
-                        file_name=f"bedtime_story_{audio_data['voice_name'].replace(' ', '_')}.mp3",
+                        label=f"💾 Download {voice_name} Version",
+                        data=audio_bytes,
+                        file_name=f"bedtime_story_{voice_name.replace(' ', '_')}.mp3",
                         mime="audio/mpeg",
                         key=f"download_{voice_id}"
                     )
@@ -507,71 +960,24 @@ def main():
                 # Interactive highlighting demonstration
                 st.subheader("🎯 Interactive Read-Along")
                 
-                if st.button("▶️ Start Read-Along Demo (3 seconds per sentence)"):
+                read_along_voice = st.selectbox(
+                    "Read along with",
+                    list(story_audio),
+                    format_func=lambda voice: voice[0]
+                )
+                
+                if st.checkbox("▶️ Show Read-Along Player"):
                     # Note: Read-along feature works best without images for now
                     if "story_images" in st.session_state:
                         st.info("💡 Read-along demo works best when images are not displayed. Clear the story and regenerate without images for the full read-along experience.")
                     
-                    # Split story into sentences for the demo
-                    import re
-                    sentences = re.split(r'(?<=[.!?])\s+', story.strip())
-                    sentences = [s.strip() for s in sentences if s.strip()]
-                    
-                    # Create a placeholder for the highlighted story
-                    story_placeholder = st.empty()
-                    
-                    for i, sentence in enumerate(sentences):
-                        # Create highlighted version
-                        highlighted_story = ""
-                        for j, sent in enumerate(sentences):
-                            if j < i:
-                                # Completed sentences - green background
-                                highlighted_story += f'<span style="background-color: #c8e6c9; padding: 2px 4px; border-radius: 3px; opacity: 0.8;">{sent}</span> '
-                            elif j == i:
-                                # Current sentence - yellow highlight
-                                highlighted_story += f'<span style="background-color: #ffeb3b; padding: 2px 4px; border-radius: 3px; font-weight: bold; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">{sent}</span> '
-                            else:
-                                # Future sentences - normal
-                                highlighted_story += f'<span style="padding: 2px 4px;">{sent}</span> '
-                        
-                        # Update the story display
-                        story_placeholder.markdown(f'''
-                        <div style="
-                            margin-top: 20px; 
-                            padding: 20px; 
-                            background-color: #f8f9fa; 
-                            border-radius: 10px;
-                            font-size: 1.1em;
-                            line-height: 1.8;
-                            border-left: 4px solid #007acc;
-                        ">
-                            {highlighted_story}
-                        </div>
-                        ''', unsafe_allow_html=True)
-                        
-                        # Wait 3 seconds before next sentence
-                        time.sleep(3)
-                    
-                    # Final state - all completed
-                    final_story = ""
-                    for sent in sentences:
-                        final_story += f'<span style="background-color: #c8e6c9; padding: 2px 4px; border-radius: 3px; opacity: 0.8;">{sent}</span> '
-                    
-                    story_placeholder.markdown(f'''
-                    <div style="
-                        margin-top: 20px; 
-                        padding: 20px; 
-                        background-color: #f8f9fa; 
-                        border-radius: 10px;
-                        font-size: 1.1em;
-                        line-height: 1.8;
-                        border-left: 4px solid #007acc;
-                    ">
-                        {final_story}
-                    </div>
-                    ''', unsafe_allow_html=True)
+                    sentences = split_story_sentences(story)
                     
-                    st.success("✅ Read-along complete! Perfect for following along with the audio.")
+                    # Highlighting follows the audio in the browser, so no reruns are needed
+                    read_along_audio = story_audio.get(read_along_voice)
+                    if read_along_audio:
+                        # The iframe sizes itself to the player, so long stories need no scrollbar
+                        st.iframe(create_read_along_player(read_along_audio, sentences))
     
     elif generate_button:
         st.warning("Please enter a story idea first!")